@@ -1,5 +1,9 @@
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Literal, Optional
 
 from dotenv import load_dotenv
 from livekit.agents import (
@@ -23,9 +27,11 @@ from livekit.plugins.turn_detector.multilingual import MultilingualModel
 from database import (
     init_database,
     get_fraud_case_by_username,
-    verify_security_identifier,
-    verify_security_answer,
-    update_fraud_case_status
+    verify_security_identifier_on_case,
+    verify_security_answer_on_case,
+    update_fraud_case_status,
+    set_case_details_template,
+    warm_cache
 )
 
 logger = logging.getLogger("agent")
@@ -35,50 +41,132 @@ load_dotenv(".env.local")
 # Initialize database on module load
 init_database()
 
+# Dedicated thread for database writes: keeps disk I/O off the event loop, and a
+# single worker serializes writers so concurrent hangups never contend for the
+# SQLite write lock
+_DB_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fraud-db")
+
+
+async def _run_db(func, *args):
+    """Run a blocking database helper on the database thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_DB_EXECUTOR, func, *args)
+
+
+ASSISTANT_INSTRUCTIONS = """You are Amit, a fraud detection representative from UBI Bank's (Union Bank of India) fraud prevention department.
+The user is interacting with you via voice.
+
+Your role is to:
+1. Introduce yourself professionally as Amit calling from UBI Bank's fraud department
+2. Verify the customer's identity using their username and security identifier
+3. Ask the security question from their file to confirm their identity
+4. Explain the suspicious transaction clearly and calmly
+5. Ask if they made the transaction (yes or no)
+6. Take appropriate action based on their response
+
+CALL FLOW:
+- Start by greeting them and introducing yourself as Amit from UBI Bank fraud department
+- Ask for their name (username) and their security identifier
+- Once you have both, use verify_customer tool to load their fraud case and check the identifier in one step
+- If they only give their name, use load_fraud_case tool first, then verify_identifier tool once they give the identifier
+- If verification fails, politely end the call using finalize_case tool with outcome "failed"
+- If verified, ask the security question from their case
+- Use verify_security_answer tool to check their answer
+- If answer is wrong, politely end the call using finalize_case tool with outcome "failed"
+- If answer is correct, read out the suspicious transaction details
+- Ask clearly: "Did you make this transaction?"
+- Based on their yes/no answer:
+  * If YES: Use finalize_case tool with outcome "safe"
+  * If NO: Use finalize_case tool with outcome "fraud"
+- Confirm the action taken and thank them
+
+Keep responses concise, professional, and reassuring.
+Never ask for full card numbers, PINs, or passwords.
+Use the provided tools to load cases and update statuses."""
+
+
+# Case-details block read back to the LLM when a case is loaded. The database
+# renders it into each cached case's "details" field, so it is formatted once
+# per cache load rather than on every tool call
+CASE_DETAILS_TEMPLATE = """Card ending: {cardEnding}
+Transaction: ${transactionAmount} at {transactionName}
+Category: {transactionCategory}
+Location: {transactionLocation}
+Time: {transactionTime}
+Source: {transactionSource}
+Security Question: {securityQuestion}"""
+
+set_case_details_template(CASE_DETAILS_TEMPLATE)
+
+# Replies to the LLM, shared by the case loading and verification tools
+NO_CASE_REPLY = "No pending fraud alert found for {username}. This call may be in error."
+CASE_LOADED_REPLY = "Fraud case loaded for {username}.\n{details}\n\n{next_step}"
+ASK_IDENTIFIER_REPLY = "Now verify their security identifier before proceeding."
+IDENTIFIER_VERIFIED_REPLY = "Security identifier verified successfully. Now ask the security question."
+IDENTIFIER_FAILED_REPLY = "Security identifier does not match. Identity verification failed."
+ANSWER_VERIFIED_REPLY = "Security answer verified. Identity confirmed. Now read out the transaction details and ask if they made the purchase."
+ANSWER_FAILED_REPLY = "Security answer incorrect. Identity verification failed."
+
+
+# finalize_case outcome -> (case status, stored outcome template, reply to the LLM).
+# Outcome templates are formatted with the case's fields
+CASE_OUTCOMES = {
+    "safe": (
+        "confirmed_safe",
+        "Customer confirmed transaction as legitimate.",
+        "Transaction marked as safe. No further action needed. Thank the customer and end the call.",
+    ),
+    "fraud": (
+        "confirmed_fraud",
+        "Customer denied transaction. Card ending {cardEnding} has been blocked. Dispute case opened.",
+        "Transaction marked as fraudulent. Card has been blocked and dispute opened. Inform the customer and thank them for reporting this.",
+    ),
+    "failed": (
+        "verification_failed",
+        "Identity verification failed during fraud alert call.",
+        "Verification marked as failed. Politely end the call and suggest they contact the bank directly.",
+    ),
+}
+
+
+@dataclass
+class CallState:
+    """Fraud case context for one call, kept on the session's userdata."""
+    current_case: Optional[dict] = None
+    # The username as stored in the database, not as the caller said it
+    current_username: Optional[str] = None
 
 
 class Assistant(Agent):
     def __init__(self) -> None:
-        super().__init__(
-            instructions="""You are Amit, a fraud detection representative from UBI Bank's (Union Bank of India) fraud prevention department. 
-            The user is interacting with you via voice.
-            
-            Your role is to:
-            1. Introduce yourself professionally as Amit calling from UBI Bank's fraud department
-            2. Verify the customer's identity using their username and security identifier
-            3. Ask the security question from their file to confirm their identity
-            4. Explain the suspicious transaction clearly and calmly
-            5. Ask if they made the transaction (yes or no)
-            6. Take appropriate action based on their response
-            
-            CALL FLOW:
-            - Start by greeting them and introducing yourself as Amit from UBI Bank fraud department
-            - Ask for their name (username)
-            - Use load_fraud_case tool to get their fraud case details
-            - Ask for their security identifier to verify identity
-            - Use verify_identifier tool to check it
-            - If verification fails, politely end the call using mark_verification_failed tool
-            - If verified, ask the security question from their case
-            - Use verify_security_answer tool to check their answer
-            - If answer is wrong, politely end the call using mark_verification_failed tool
-            - If answer is correct, read out the suspicious transaction details
-            - Ask clearly: "Did you make this transaction?"
-            - Based on their yes/no answer:
-              * If YES: Use mark_transaction_safe tool
-              * If NO: Use mark_transaction_fraudulent tool
-            - Confirm the action taken and thank them
+        super().__init__(instructions=ASSISTANT_INSTRUCTIONS)
+
+    @staticmethod
+    def _load_case(state: CallState, username: str) -> Optional[dict]:
+        """Look up the pending case for username and attach it to the call state.
+        
+        Args:
+            state: The call's userdata
+            username: The customer's name as they said it
             
-            Keep responses concise, professional, and reassuring.
-            Never ask for full card numbers, PINs, or passwords.
-            Use the provided tools to load cases and update statuses.""",
-        )
+        Returns:
+            The case, or None if the customer has no pending fraud case
+        """
+        case = get_fraud_case_by_username(username)
         
-        # Store current fraud case context
-        self.current_case = None
-        self.current_username = None
+        if not case:
+            logger.warning("No pending fraud case found for %s", username)
+            return None
+        
+        state.current_case = case
+        # Store the actual username from database, not user input
+        state.current_username = case['userName']
+        logger.debug("Loaded case: %s", case)
+        
+        return case
 
     @function_tool
-    async def load_fraud_case(self, context: RunContext, username: str):
+    async def load_fraud_case(self, context: RunContext[CallState], username: str):
         """Load the pending fraud case for a specific user.
         
         This tool retrieves fraud case details from the database for the given username.
@@ -87,32 +175,62 @@ class Assistant(Agent):
         Args:
             username: The customer's name
         """
-        logger.info(f"Loading fraud case for username: {username}")
+        logger.info("Loading fraud case for username: %s", username)
         
-        case = get_fraud_case_by_username(username)
+        case = self._load_case(context.userdata, username)
         
-        if case:
-            self.current_case = case
-            # Store the actual username from database, not user input
-            self.current_username = case['userName']
-            logger.info(f"Loaded case: {case}")
-            
-            return f"""Fraud case loaded for {username}.
-Card ending: {case['cardEnding']}
-Transaction: ${case['transactionAmount']} at {case['transactionName']}
-Category: {case['transactionCategory']}
-Location: {case['transactionLocation']}
-Time: {case['transactionTime']}
-Source: {case['transactionSource']}
-Security Question: {case['securityQuestion']}
-
-Now verify their security identifier before proceeding."""
+        if not case:
+            return NO_CASE_REPLY.format(username=username)
+        
+        return CASE_LOADED_REPLY.format(
+            username=username, details=case["details"], next_step=ASK_IDENTIFIER_REPLY
+        )
+
+    @function_tool
+    async def verify_customer(
+        self,
+        context: RunContext[CallState],
+        username: str,
+        identifier: Optional[str] = None,
+        answer: Optional[str] = None,
+    ):
+        """Load the customer's fraud case and verify their identity in one step.
+        
+        Use this tool once the customer has given their name and security identifier,
+        instead of calling load_fraud_case and verify_identifier separately.
+        Blank values count as not provided. The answer is only checked together
+        with the identifier; without an identifier it is ignored.
+        
+        Args:
+            username: The customer's name
+            identifier: The security identifier provided by the customer
+            answer: The customer's answer to the security question, once it has been asked
+        """
+        logger.info("Loading and verifying fraud case for username: %s", username)
+        
+        case = self._load_case(context.userdata, username)
+        
+        if not case:
+            return NO_CASE_REPLY.format(username=username)
+        
+        # Failed checks only get the failure step, never the case details
+        if identifier is None or not identifier.strip():
+            next_step = ASK_IDENTIFIER_REPLY
+        elif not verify_security_identifier_on_case(case, identifier):
+            return IDENTIFIER_FAILED_REPLY
+        elif answer is None or not answer.strip():
+            next_step = IDENTIFIER_VERIFIED_REPLY
+        elif verify_security_answer_on_case(case, answer):
+            next_step = ANSWER_VERIFIED_REPLY
         else:
-            logger.warning(f"No pending fraud case found for {username}")
-            return f"No pending fraud alert found for {username}. This call may be in error."
+            return ANSWER_FAILED_REPLY
+        
+        return CASE_LOADED_REPLY.format(
+            username=username, details=case["details"], next_step=next_step
+        )
 
     @function_tool
-    async def verify_identifier(self, context: RunContext, identifier: str):
+    async def verify_identifier(self, context: RunContext[CallState], identifier: str):
         """Verify the customer's security identifier.
         
         Use this tool after the user provides their security identifier to verify their identity.
@@ -120,20 +238,24 @@ Now verify their security identifier before proceeding."""
         Args:
             identifier: The security identifier provided by the customer
         """
-        if not self.current_username:
+        state = context.userdata
+        
+        if not state.current_case:
             return "Error: No fraud case loaded yet. Ask for username first."
         
-        logger.info(f"Verifying identifier for {self.current_username}: {identifier}")
+        logger.info("Verifying identifier for %s: %s", state.current_username, identifier)
         
-        is_valid = verify_security_identifier(self.current_username, identifier)
+        # Check against the case already loaded for this call instead of
+        # looking it up again by name
+        is_valid = verify_security_identifier_on_case(state.current_case, identifier)
         
         if is_valid:
-            return "Security identifier verified successfully. Now ask the security question."
+            return IDENTIFIER_VERIFIED_REPLY
         else:
-            return "Security identifier does not match. Identity verification failed."
+            return IDENTIFIER_FAILED_REPLY
 
     @function_tool
-    async def verify_security_answer(self, context: RunContext, answer: str):
+    async def verify_security_answer(self, context: RunContext[CallState], answer: str):
         """Verify the customer's answer to the security question.
         
         Use this tool after the customer answers the security question.
@@ -141,90 +263,63 @@ Now verify their security identifier before proceeding."""
         Args:
             answer: The customer's answer to the security question
         """
-        if not self.current_username or not self.current_case:
+        state = context.userdata
+        
+        if not state.current_username or not state.current_case:
             return "Error: No fraud case loaded yet."
         
-        logger.info(f"Verifying security answer for {self.current_username}")
+        logger.info("Verifying security answer for %s", state.current_username)
         
-        is_correct = verify_security_answer(self.current_username, answer)
+        is_correct = verify_security_answer_on_case(state.current_case, answer)
         
         if is_correct:
-            return "Security answer verified. Identity confirmed. Now read out the transaction details and ask if they made the purchase."
+            return ANSWER_VERIFIED_REPLY
         else:
-            return "Security answer incorrect. Identity verification failed."
+            return ANSWER_FAILED_REPLY
 
     @function_tool
-    async def mark_transaction_safe(self, context: RunContext):
-        """Mark the transaction as safe (customer confirmed they made it).
+    async def finalize_case(
+        self,
+        context: RunContext[CallState],
+        outcome: Literal["safe", "fraud", "failed"],
+    ):
+        """Record the outcome of the fraud alert call on the customer's case.
         
-        Use this tool when the customer confirms YES, they made the transaction.
-        """
-        if not self.current_username:
-            return "Error: No fraud case loaded."
-        
-        logger.info(f"Marking transaction as safe for {self.current_username}")
-        
-        outcome = "Customer confirmed transaction as legitimate."
-        success = update_fraud_case_status(
-            self.current_username,
-            "confirmed_safe",
-            outcome
-        )
+        Use this tool once the call has reached an outcome:
+        - "safe": the customer confirms YES, they made the transaction
+        - "fraud": the customer confirms NO, they did NOT make the transaction
+        - "failed": identity verification failed (wrong identifier or security answer)
         
-        if success:
-            return f"Transaction marked as safe. No further action needed. Thank the customer and end the call."
-        else:
-            return "Error updating case status."
-
-    @function_tool
-    async def mark_transaction_fraudulent(self, context: RunContext):
-        """Mark the transaction as fraudulent (customer denied making it).
-        
-        Use this tool when the customer confirms NO, they did NOT make the transaction.
+        Args:
+            outcome: One of "safe", "fraud" or "failed"
         """
-        if not self.current_username:
-            return "Error: No fraud case loaded."
-        
-        logger.info(f"Marking transaction as fraudulent for {self.current_username}")
+        state = context.userdata
         
-        outcome = f"Customer denied transaction. Card ending {self.current_case['cardEnding']} has been blocked. Dispute case opened."
-        success = update_fraud_case_status(
-            self.current_username,
-            "confirmed_fraud",
-            outcome
-        )
-        
-        if success:
-            return f"Transaction marked as fraudulent. Card has been blocked and dispute opened. Inform the customer and thank them for reporting this."
-        else:
-            return "Error updating case status."
-
-    @function_tool
-    async def mark_verification_failed(self, context: RunContext):
-        """Mark the case as verification failed.
-        
-        Use this tool when identity verification fails (wrong identifier or security answer).
-        """
-        if not self.current_username:
-            return "No case to mark."
+        if not state.current_case:
+            return "Error: No fraud case loaded."
         
-        logger.info(f"Marking verification failed for {self.current_username}")
+        status, outcome_template, reply = CASE_OUTCOMES[outcome]
+        logger.info("Finalizing case for %s as %s", state.current_username, status)
         
-        outcome = "Identity verification failed during fraud alert call."
-        success = update_fraud_case_status(
-            self.current_username,
-            "verification_failed",
-            outcome
+        success = await _run_db(
+            update_fraud_case_status,
+            state.current_username,
+            status,
+            outcome_template.format(**state.current_case)
         )
         
         if success:
-            return "Verification marked as failed. Politely end the call and suggest they contact the bank directly."
+            return reply
         else:
             return "Error updating case status."
 
 
 def prewarm(proc: JobProcess):
+    # Load and index the pending fraud cases on the database thread while the
+    # VAD model loads, so the first lookup of the first call is served from memory
+    pending = _DB_EXECUTOR.submit(warm_cache)
     proc.userdata["vad"] = silero.VAD.load()
+    logger.info("Preloaded %d pending fraud cases", pending.result())
 
 
 async def entrypoint(ctx: JobContext):
@@ -235,10 +330,23 @@ async def entrypoint(ctx: JobContext):
     }
 
     # Set up a voice AI pipeline using OpenAI, Cartesia, AssemblyAI, and the LiveKit turn detector
-    session = AgentSession(
+    session = AgentSession[CallState](
+        # Per-call fraud case context, read and updated by the Assistant's tools
+        userdata=CallState(),
         # Speech-to-text (STT) is your agent's ears, turning the user's speech into text that the LLM can understand
         # See all available models at https://docs.livekit.io/agents/models/stt/
-        stt=deepgram.STT(model="nova-3"),
+        stt=deepgram.STT(
+            model="nova-3",
+            # Stream interim transcripts and finalize after 25ms of silence so
+            # turn detection and preemptive generation can start as early as possible
+            interim_results=True,
+            endpointing_ms=25,
+            punctuate=True,
+            # Format spoken digits (identifiers, amounts) without waiting for
+            # the whole number sequence to complete
+            smart_format=True,
+            no_delay=True,
+        ),
         # A Large Language Model (LLM) is your agent's brain, processing user input and generating a response
         # See all available models at https://docs.livekit.io/agents/models/llm/
         llm=google.LLM(
@@ -256,6 +364,11 @@ async def entrypoint(ctx: JobContext):
         # See more at https://docs.livekit.io/agents/build/turns
         turn_detection=MultilingualModel(),
         vad=ctx.proc.userdata["vad"],
+        # Commit the turn soon after the turn detector predicts the user is done, but
+        # keep enough headroom for callers who pause while reading out digits
+        # See more at https://docs.livekit.io/agents/build/turns
+        min_endpointing_delay=0.2,
+        max_endpointing_delay=2.0,
         # allow the LLM to generate a response while waiting for the end of turn
         # See more at https://docs.livekit.io/agents/build/audio/#preemptive-generation
         preemptive_generation=True,
@@ -282,7 +395,7 @@ async def entrypoint(ctx: JobContext):
 
     async def log_usage():
         summary = usage_collector.get_summary()
-        logger.info(f"Usage: {summary}")
+        logger.info("Usage: %s", summary)
 
     ctx.add_shutdown_callback(log_usage)
 
@@ -1,6 +1,12 @@
+import hmac
+import re
 import sqlite3
 import logging
+import threading
+import time
+import unicodedata
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 
@@ -8,12 +14,46 @@ logger = logging.getLogger("database")
 
 # Database file path - in src folder
 DB_PATH = Path(__file__).parent / "fraud_cases.db"
+# Write-ahead log that SQLite keeps next to the database in WAL mode
+WAL_PATH = DB_PATH.with_name(DB_PATH.name + "-wal")
+
+# Upper bound on how much of the database file SQLite memory-maps for reads
+MMAP_SIZE = 64 * 1024 * 1024
+
+# In-memory copy of the pending cases and their username index, keyed by the
+# database file's (mtime, size) so it is re-read only when the file changes
+_CACHE: Dict[str, Any] = {"signature": None, "data": None}
+_CACHE_LOCK = threading.Lock()
+
+# Template for each cached case's "details" field. The agent owns the wording
+# and sets it via set_case_details_template; it is rendered whenever the case
+# cache is (re)built
+_details_template: Optional[str] = None
+
+# (epoch second, ISO string) of the most recent status-update timestamp
+_last_timestamp = (-1, "")
+
+# Separators ignored in spoken usernames and identifiers, dropped in one pass
+_SEPARATOR_STRIP_TABLE = str.maketrans("", "", " -")
+
+# Identifiers also drop the digit grouping Deepgram's smart_format can add
+# (e.g. "11,907" or "11.907")
+_IDENTIFIER_STRIP_TABLE = str.maketrans("", "", " -,.")
+
+# Shape of a normalized security identifier; anything else (e.g. garbled STT
+# output) is rejected before touching the case data. The schema only requires
+# TEXT, so this stays loose: letters, digits and underscores. Stored identifiers
+# outside it are logged when the cache is built
+_IDENTIFIER_RE = re.compile(r"\w{1,32}")
 
 
 def get_connection():
     """Create and return a database connection."""
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row  # Enable column access by name
+    # Read pages straight from a shared memory mapping of the file instead of
+    # copying them into SQLite's page cache with read() calls
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
     return conn
 
 
@@ -22,6 +62,11 @@ def init_database():
     conn = get_connection()
     cursor = conn.cursor()
     
+    # WAL mode appends each status update to a journal instead of rewriting
+    # pages in place, keeping commits atomic with a single fsync; the setting
+    # is persistent in the database file
+    cursor.execute("PRAGMA journal_mode=WAL")
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS fraud_cases (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -42,47 +87,225 @@ def init_database():
         )
     ''')
     
+    # Status updates look cases up by user and status
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_fraud_cases_user_status
+        ON fraud_cases (userName, caseStatus)
+    ''')
+    
     conn.commit()
     conn.close()
     logger.info("Database initialized successfully")
 
 
-def get_fraud_case_by_username(username: str) -> Optional[Dict[str, Any]]:
-    """
-    Retrieve a pending fraud case for a specific user.
+# Callers repeat the same name across turns and retries, and the mapping is pure
+@lru_cache(maxsize=256)
+def _normalize_username(name: str) -> str:
+    """Normalize a username for matching - remove spaces/hyphens, accents and case."""
+    if name.isascii():
+        return name.lower().translate(_SEPARATOR_STRIP_TABLE)
     
-    Args:
-        username: The user's name
-        
-    Returns:
-        Dictionary containing fraud case details or None if not found
-    """
+    # Decompose accented letters and drop the combining marks so e.g. "Ritikā"
+    # matches "Ritika", then casefold for locale-independent caseless matching
+    decomposed = unicodedata.normalize("NFKD", name)
+    base = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return base.casefold().translate(_SEPARATOR_STRIP_TABLE)
+
+
+def _canonical_identifier(identifier: str) -> str:
+    """Drop separators and whitespace from a security identifier and uppercase it."""
+    return identifier.translate(_IDENTIFIER_STRIP_TABLE).strip().upper()
+
+
+def _normalize_identifier(identifier: str) -> Optional[str]:
+    """Normalize a security identifier, or return None if it is malformed."""
+    normalized = _canonical_identifier(identifier)
+    return normalized if _IDENTIFIER_RE.fullmatch(normalized) else None
+
+
+def _now_iso() -> str:
+    """Return the current local time in ISO format, formatted at most once per second."""
+    global _last_timestamp
+    
+    second = int(time.time())
+    cached_second, value = _last_timestamp
+    if second != cached_second:
+        value = datetime.fromtimestamp(second).isoformat()
+        # Swap the whole tuple so concurrent readers never see a mixed pair
+        _last_timestamp = (second, value)
+    return value
+
+
+def _db_signature() -> Optional[tuple]:
+    """Return a cheap fingerprint of the database files, or None if missing."""
+    try:
+        stat = DB_PATH.stat()
+    except FileNotFoundError:
+        return None
+    
+    # Commits land in the WAL until the next checkpoint, so it has to be
+    # part of the fingerprint for changes from other processes to show up
+    try:
+        wal_stat = WAL_PATH.stat()
+        wal = (wal_stat.st_mtime_ns, wal_stat.st_size)
+    except FileNotFoundError:
+        wal = None
+    
+    return (stat.st_mtime_ns, stat.st_size, wal)
+
+
+def _load_pending_cases() -> List[Dict[str, Any]]:
+    """Read all pending fraud cases straight from the database."""
     conn = get_connection()
     cursor = conn.cursor()
     
-    # Normalize the input username - remove spaces and convert to lowercase
-    normalized_input = username.lower().replace(" ", "").replace("-", "")
-    
-    # Get all pending cases
     cursor.execute('''
         SELECT * FROM fraud_cases 
         WHERE caseStatus = 'pending_review'
     ''')
     
-    cases = cursor.fetchall()
+    cases = [dict(row) for row in cursor.fetchall()]
     conn.close()
-    
-    # Find matching case with normalized username comparison
+    return cases
+
+
+def _build_cache(cases: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Index pending cases by normalized username (first case wins) and
+    precompute the normalized fields the verification helpers compare,
+    plus the rendered "details" block if a template is set.
+    """
+    by_norm: Dict[str, Dict[str, Any]] = {}
     for case in cases:
+        if _details_template is not None:
+            case["details"] = _details_template.format(**case)
+        case["_idNorm"] = _canonical_identifier(case["securityIdentifier"])
+        if not _IDENTIFIER_RE.fullmatch(case["_idNorm"]):
+            logger.warning(
+                "Security identifier for case %s does not match %s and can never be verified",
+                case["id"], _IDENTIFIER_RE.pattern,
+            )
+        case["_answerNorm"] = (
+            case["securityAnswer"].lower().strip() if case["securityAnswer"] else None
+        )
+        
         if case["userName"]:
-            # Normalize the stored username as well
-            normalized_stored = case["userName"].lower().replace(" ", "").replace("-", "")
-            
-            # Match if normalized names are the same
-            if normalized_stored == normalized_input:
-                return dict(case)
+            by_norm.setdefault(_normalize_username(case["userName"]), case)
     
-    return None
+    return {"cases": cases, "by_norm": by_norm}
+
+
+def _read_cache() -> Dict[str, Any]:
+    """
+    Return the pending fraud cases and their username index, served from
+    memory while the database file is unchanged.
+    
+    Returns:
+        Dictionary with the pending "cases" list and the "by_norm" index
+    """
+    signature = _db_signature()
+    
+    with _CACHE_LOCK:
+        if signature is not None and _CACHE["signature"] == signature:
+            return _CACHE["data"]
+        
+        data = _build_cache(_load_pending_cases())
+        _CACHE["signature"] = signature
+        _CACHE["data"] = data
+        return data
+
+
+def _invalidate_cache() -> None:
+    """Drop the cached cases so the next read goes back to the database."""
+    with _CACHE_LOCK:
+        _CACHE["signature"] = None
+        _CACHE["data"] = None
+
+
+def set_case_details_template(template: Optional[str]) -> None:
+    """
+    Set the template rendered into each pending case's "details" field.
+    
+    Args:
+        template: str.format template over the case's columns, or None to
+            stop rendering details
+    """
+    global _details_template
+    _details_template = template
+    _invalidate_cache()
+
+
+def warm_cache() -> int:
+    """
+    Load the pending fraud cases and their index into memory ahead of the
+    first lookup.
+    
+    Returns:
+        Number of pending cases loaded
+    """
+    return len(_read_cache()["cases"])
+
+
+def get_fraud_case_by_username(username: str) -> Optional[Dict[str, Any]]:
+    """
+    Retrieve a pending fraud case for a specific user.
+    
+    Args:
+        username: The user's name
+        
+    Returns:
+        Dictionary containing fraud case details or None if not found. Besides
+        the table columns it carries the fields derived at cache load:
+        "details" (the rendered case-details block, when a template is set via
+        set_case_details_template) and the private "_idNorm" and "_answerNorm"
+        used by the verification helpers
+    """
+    # Stored usernames are normalized once per cache load, so a lookup is a
+    # single dict hit on the normalized input
+    case = _read_cache()["by_norm"].get(_normalize_username(username))
+    
+    return dict(case) if case else None
+
+
+def _credentials_match(stored: str, provided: str) -> bool:
+    """Compare a stored credential in constant time, rejecting length mismatches first."""
+    # compare_digest only accepts ASCII str, so compare the UTF-8 bytes
+    return len(stored) == len(provided) and hmac.compare_digest(
+        stored.encode(), provided.encode()
+    )
+
+
+def verify_security_identifier_on_case(case: Dict[str, Any], identifier: str) -> bool:
+    """
+    Verify the security identifier against an already-loaded fraud case.
+    
+    Args:
+        case: The fraud case, as returned by get_fraud_case_by_username
+        identifier: The security identifier to verify
+        
+    Returns:
+        True if identifier matches, False otherwise
+    """
+    provided = _normalize_identifier(identifier)
+    if provided is None:
+        return False
+    return _credentials_match(case["_idNorm"], provided)
+
+
+def verify_security_answer_on_case(case: Dict[str, Any], answer: str) -> bool:
+    """
+    Verify the security question answer against an already-loaded fraud case.
+    
+    Args:
+        case: The fraud case, as returned by get_fraud_case_by_username
+        answer: The security answer to verify
+        
+    Returns:
+        True if answer matches (case-insensitive), False otherwise
+    """
+    if case["_answerNorm"]:
+        return _credentials_match(case["_answerNorm"], answer.lower().strip())
+    return False
 
 
 def verify_security_identifier(username: str, identifier: str) -> bool:
@@ -96,9 +319,14 @@ def verify_security_identifier(username: str, identifier: str) -> bool:
     Returns:
         True if identifier matches, False otherwise
     """
+    # Malformed identifiers can never match, so skip the case lookup
+    provided = _normalize_identifier(identifier)
+    if provided is None:
+        return False
+    
     case = get_fraud_case_by_username(username)
     if case:
-        return case["securityIdentifier"] == identifier
+        return _credentials_match(case["_idNorm"], provided)
     return False
 
 
@@ -114,8 +342,8 @@ def verify_security_answer(username: str, answer: str) -> bool:
         True if answer matches (case-insensitive), False otherwise
     """
     case = get_fraud_case_by_username(username)
-    if case and case["securityAnswer"]:
-        return case["securityAnswer"].lower() == answer.lower().strip()
+    if case:
+        return verify_security_answer_on_case(case, answer)
     return False
 
 
@@ -135,10 +363,10 @@ def update_fraud_case_status(username: str, status: str, outcome: str) -> bool:
         conn = get_connection()
         cursor = conn.cursor()
         
-        current_time = datetime.now().isoformat()
+        current_time = _now_iso()
         
         # Log the update attempt
-        logger.info(f"Attempting to update case for username='{username}', status='{status}'")
+        logger.info("Attempting to update case for username='%s', status='%s'", username, status)
         
         cursor.execute('''
             UPDATE fraud_cases 
@@ -149,15 +377,16 @@ def update_fraud_case_status(username: str, status: str, outcome: str) -> bool:
         updated = cursor.rowcount > 0
         conn.commit()
         conn.close()
+        _invalidate_cache()
         
         if updated:
-            logger.info(f"Successfully updated fraud case for {username}: {status} - {outcome}")
+            logger.info("Successfully updated fraud case for %s: %s - %s", username, status, outcome)
             return True
         else:
-            logger.warning(f"No pending fraud case found for username='{username}'. Check if case exists and is pending.")
+            logger.warning("No pending fraud case found for username='%s'. Check if case exists and is pending.", username)
             return False
     except Exception as e:
-        logger.error(f"Error updating fraud case for {username}: {e}")
+        logger.error("Error updating fraud case for %s: %s", username, e)
         return False
 
 
@@ -218,8 +447,9 @@ def insert_fraud_case(case: Dict[str, Any]) -> bool:
         
         conn.commit()
         conn.close()
-        logger.info(f"Inserted fraud case for {case.get('userName')}")
+        _invalidate_cache()
+        logger.info("Inserted fraud case for %s", case.get("userName"))
         return True
     except Exception as e:
-        logger.error(f"Error inserting fraud case: {e}")
+        logger.error("Error inserting fraud case: %s", e)
         return False
\ No newline at end of file
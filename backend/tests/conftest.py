@@ -0,0 +1,27 @@
+import shutil
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Point the database module at a copy of the seed data with every case pending."""
+    db_path = tmp_path / "fraud_cases.db"
+    shutil.copy(Path(database.__file__).with_name("fraud_cases.db"), db_path)
+    monkeypatch.setattr(database, "DB_PATH", db_path)
+    monkeypatch.setattr(database, "WAL_PATH", db_path.with_name(db_path.name + "-wal"))
+
+    database._invalidate_cache()
+    database.init_database()
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE fraud_cases SET caseStatus = 'pending_review'")
+    conn.commit()
+    conn.close()
+
+    yield database
+
+    database._invalidate_cache()
@@ -1,7 +1,7 @@
 import pytest
 from livekit.agents import AgentSession, inference, llm
 
-from agent import Assistant
+from agent import Assistant, CallState
 
 
 def _llm() -> llm.LLM:
@@ -13,7 +13,7 @@ async def test_offers_assistance() -> None:
     """Evaluation of the agent's friendly nature."""
     async with (
         _llm() as llm,
-        AgentSession(llm=llm) as session,
+        AgentSession(llm=llm, userdata=CallState()) as session,
     ):
         await session.start(Assistant())
 
@@ -45,7 +45,7 @@ async def test_grounding() -> None:
     """Evaluation of the agent's ability to refuse to answer when it doesn't know something."""
     async with (
         _llm() as llm,
-        AgentSession(llm=llm) as session,
+        AgentSession(llm=llm, userdata=CallState()) as session,
     ):
         await session.start(Assistant())
 
@@ -87,7 +87,7 @@ async def test_refuses_harmful_request() -> None:
     """Evaluation of the agent's ability to refuse inappropriate or harmful requests."""
     async with (
         _llm() as llm,
-        AgentSession(llm=llm) as session,
+        AgentSession(llm=llm, userdata=CallState()) as session,
     ):
         await session.start(Assistant())
 
@@ -0,0 +1,121 @@
+import sqlite3
+
+import pytest
+
+import database
+
+
+def test_lookup_is_served_from_cache(db, monkeypatch) -> None:
+    """Repeated lookups don't hit the database while it is unchanged."""
+    calls = []
+    load = db._load_pending_cases
+    monkeypatch.setattr(db, "_load_pending_cases", lambda: calls.append(1) or load())
+
+    assert db.get_fraud_case_by_username("Ritika")["securityIdentifier"] == "11907"
+    assert db.get_fraud_case_by_username("Rohit")["securityIdentifier"] == "44782"
+    assert len(calls) == 1
+
+
+def test_cache_reloads_after_status_update(db) -> None:
+    """A resolved case drops out of the pending lookup straight away."""
+    assert db.get_fraud_case_by_username("pritam") is not None
+
+    assert db.update_fraud_case_status("pritam", "confirmed_safe", "Test outcome.")
+
+    assert db.get_fraud_case_by_username("pritam") is None
+    assert db.get_fraud_case_by_username("Ritika") is not None
+
+
+def test_cache_reloads_after_external_write(db) -> None:
+    """Writes from another connection are picked up on the next lookup."""
+    assert db.get_fraud_case_by_username("Ritika")["transactionName"] == "IRCTC Ticket Booking"
+
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute(
+        "UPDATE fraud_cases SET transactionName = 'Test Merchant' WHERE userName = 'Ritika'"
+    )
+    conn.execute("UPDATE fraud_cases SET caseStatus = 'confirmed_fraud' WHERE userName = 'Sneha'")
+    conn.commit()
+    conn.close()
+
+    assert db.get_fraud_case_by_username("Ritika")["transactionName"] == "Test Merchant"
+    assert db.get_fraud_case_by_username("Sneha") is None
+
+
+@pytest.mark.parametrize(
+    "identifier", ["11907", "1 1 9 0 7", "11-907", " 11907 ", "11,907", "11.907"]
+)
+def test_identifier_accepted(db, identifier: str) -> None:
+    assert db.verify_security_identifier("Ritika", identifier)
+    case = db.get_fraud_case_by_username("Ritika")
+    assert db.verify_security_identifier_on_case(case, identifier)
+
+
+@pytest.mark.parametrize("identifier", ["1190", "119070", "", "   ", "11907!"])
+def test_identifier_rejected(db, identifier: str) -> None:
+    assert not db.verify_security_identifier("Ritika", identifier)
+    case = db.get_fraud_case_by_username("Ritika")
+    assert not db.verify_security_identifier_on_case(case, identifier)
+
+
+@pytest.mark.parametrize("stored, spoken", [("AB_123", "ab_123"), ("123", "1 2 3")])
+def test_stored_identifier_shapes_verify(db, stored: str, spoken: str) -> None:
+    """Identifiers outside the seed data's five-digit shape still verify."""
+    case = db.get_fraud_case_by_username("Ritika")
+    new_case = {k: v for k, v in case.items() if not k.startswith("_") and k != "id"}
+    new_case.update(userName="Tester", securityIdentifier=stored)
+    assert db.insert_fraud_case(new_case)
+
+    assert db.verify_security_identifier("Tester", stored)
+    assert db.verify_security_identifier("Tester", spoken)
+
+
+@pytest.mark.parametrize("spoken", ["Ritika", "RITIKA", "Ritikā", "ritíka", "Ri tika"])
+def test_username_lookup_ignores_case_and_accents(db, spoken: str) -> None:
+    case = db.get_fraud_case_by_username(spoken)
+    assert case is not None
+    assert case["userName"] == "Ritika"
+
+
+def test_security_answer_ignores_case_and_whitespace(db) -> None:
+    answer = db.get_fraud_case_by_username("Ritika")["securityAnswer"]
+
+    assert db.verify_security_answer("Ritika", answer)
+    assert db.verify_security_answer("Ritika", f"  {answer.upper()} ")
+    assert not db.verify_security_answer("Ritika", "")
+
+
+def test_credentials_match_checks_length_before_comparing(monkeypatch) -> None:
+    compared = []
+    compare_digest = database.hmac.compare_digest
+    monkeypatch.setattr(
+        database.hmac,
+        "compare_digest",
+        lambda a, b: compared.append((a, b)) or compare_digest(a, b),
+    )
+
+    assert not database._credentials_match("11907", "1190")
+    assert compared == []
+
+    assert database._credentials_match("11907", "11907")
+    assert not database._credentials_match("11907", "11908")
+    assert not database._credentials_match("café", "café"[:4])
+    assert len(compared) == 3
+
+
+def test_details_rerendered_after_external_write(db, monkeypatch) -> None:
+    """The cached details block follows edits to the case, not just status changes."""
+    # Restore whatever template the agent module registered once the test is done
+    monkeypatch.setattr(db, "_details_template", db._details_template)
+    db.set_case_details_template("Transaction at {transactionName}")
+
+    assert db.get_fraud_case_by_username("Ritika")["details"] == "Transaction at IRCTC Ticket Booking"
+
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute(
+        "UPDATE fraud_cases SET transactionName = 'Test Merchant' WHERE userName = 'Ritika'"
+    )
+    conn.commit()
+    conn.close()
+
+    assert db.get_fraud_case_by_username("Ritika")["details"] == "Transaction at Test Merchant"
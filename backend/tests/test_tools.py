@@ -0,0 +1,131 @@
+from types import SimpleNamespace
+
+import pytest
+
+import agent
+from agent import Assistant, CallState
+
+
+@pytest.fixture
+def context(db):
+    """Stand-in for the RunContext the tools receive, carrying a fresh CallState."""
+    return SimpleNamespace(userdata=CallState())
+
+
+def _ritika(db) -> dict:
+    return db.get_fraud_case_by_username("Ritika")
+
+
+def _assert_no_case_details(reply: str, case: dict) -> None:
+    assert case["details"] not in reply
+    assert case["cardEnding"] not in reply
+    assert case["securityQuestion"] not in reply
+
+
+async def test_verify_customer_no_case(context) -> None:
+    reply = await Assistant().verify_customer(context, "Nobody", "11907")
+
+    assert reply == agent.NO_CASE_REPLY.format(username="Nobody")
+    assert context.userdata.current_case is None
+    assert context.userdata.current_username is None
+
+
+@pytest.mark.parametrize("identifier", [None, "", "   "])
+async def test_verify_customer_identifier_missing(db, context, identifier) -> None:
+    """Blank identifiers count as not given, not as a failed check."""
+    reply = await Assistant().verify_customer(context, "ritika", identifier, "anything")
+
+    case = _ritika(db)
+    assert reply == agent.CASE_LOADED_REPLY.format(
+        username="ritika", details=case["details"], next_step=agent.ASK_IDENTIFIER_REPLY
+    )
+    assert context.userdata.current_case["id"] == case["id"]
+    assert context.userdata.current_username == "Ritika"
+
+
+async def test_verify_customer_identifier_wrong(db, context) -> None:
+    reply = await Assistant().verify_customer(context, "Ritika", "99999")
+
+    case = _ritika(db)
+    assert reply == agent.IDENTIFIER_FAILED_REPLY
+    _assert_no_case_details(reply, case)
+    # The case stays loaded so the call can still be finalized as failed
+    assert context.userdata.current_case["id"] == case["id"]
+    assert context.userdata.current_username == "Ritika"
+
+
+@pytest.mark.parametrize("answer", [None, "", "   "])
+async def test_verify_customer_answer_missing(db, context, answer) -> None:
+    reply = await Assistant().verify_customer(context, "Ritika", "11907", answer)
+
+    case = _ritika(db)
+    assert reply == agent.CASE_LOADED_REPLY.format(
+        username="Ritika", details=case["details"], next_step=agent.IDENTIFIER_VERIFIED_REPLY
+    )
+    assert context.userdata.current_case["id"] == case["id"]
+
+
+async def test_verify_customer_answer_wrong(db, context) -> None:
+    reply = await Assistant().verify_customer(context, "Ritika", "11907", "not the answer")
+
+    case = _ritika(db)
+    assert reply == agent.ANSWER_FAILED_REPLY
+    _assert_no_case_details(reply, case)
+    assert context.userdata.current_case["id"] == case["id"]
+
+
+async def test_verify_customer_verified(db, context) -> None:
+    case = _ritika(db)
+    reply = await Assistant().verify_customer(
+        context, "Ritika", "11-907", case["securityAnswer"].upper()
+    )
+
+    assert reply == agent.CASE_LOADED_REPLY.format(
+        username="Ritika", details=case["details"], next_step=agent.ANSWER_VERIFIED_REPLY
+    )
+    assert context.userdata.current_case["id"] == case["id"]
+    assert context.userdata.current_username == "Ritika"
+
+
+@pytest.mark.parametrize(
+    "outcome, status, stored_outcome",
+    [
+        ("safe", "confirmed_safe", "Customer confirmed transaction as legitimate."),
+        (
+            "fraud",
+            "confirmed_fraud",
+            "Customer denied transaction. Card ending {cardEnding} has been blocked. "
+            "Dispute case opened.",
+        ),
+        ("failed", "verification_failed", "Identity verification failed during fraud alert call."),
+    ],
+)
+async def test_finalize_case_records_outcome(
+    db, context, monkeypatch, outcome, status, stored_outcome
+) -> None:
+    updates = []
+    update = agent.update_fraud_case_status
+    monkeypatch.setattr(
+        agent,
+        "update_fraud_case_status",
+        lambda *args: updates.append(args) or update(*args),
+    )
+    case = _ritika(db)
+    await Assistant().load_fraud_case(context, "ritika")
+
+    reply = await Assistant().finalize_case(context, outcome)
+
+    expected_outcome = stored_outcome.format(cardEnding=case["cardEnding"])
+    assert updates == [("Ritika", status, expected_outcome)]
+    if outcome == "fraud":
+        assert f"Card ending {case['cardEnding']} has been blocked" in updates[0][2]
+    assert reply == agent.CASE_OUTCOMES[outcome][2]
+    stored = next(c for c in db.get_all_cases() if c["id"] == case["id"])
+    assert (stored["caseStatus"], stored["outcome"]) == (status, expected_outcome)
+    assert db.get_fraud_case_by_username("Ritika") is None
+
+
+async def test_finalize_case_without_case(db, context, monkeypatch) -> None:
+    monkeypatch.setattr(agent, "update_fraud_case_status", pytest.fail)
+
+    assert await Assistant().finalize_case(context, "safe") == "Error: No fraud case loaded."